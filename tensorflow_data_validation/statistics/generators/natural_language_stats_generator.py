@@ -25,10 +25,12 @@ from __future__ import division
 from __future__ import print_function
 
 import collections
-from typing import Dict, Iterable, List, Optional, Set, Text, Union
+import functools
+from typing import Dict, Iterable, List, Optional, Set, Text, Tuple, Union
 
+import numpy as np
 import pyarrow as pa
-import six
+import pyarrow.compute as pc
 
 from tensorflow_data_validation import types
 from tensorflow_data_validation.statistics.generators import stats_generator
@@ -38,6 +40,7 @@ from tensorflow_data_validation.utils import stats_util
 from tensorflow_data_validation.utils import vocab_util
 
 from tfx_bsl import sketches
+from tfx_bsl.arrow import array_util
 
 from tensorflow_metadata.proto.v0 import schema_pb2
 from tensorflow_metadata.proto.v0 import statistics_pb2
@@ -52,36 +55,78 @@ _INT_VALUE = 'int_value'
 
 _NUM_MISRAGRIES_SKETCH_BUCKETS = 16384
 _QUANTILES_SKETCH_ERROR = 0.01
-_QUANTILES_SKETCH_NUM_ELEMENTS = 2 ^ 32
+_QUANTILES_SKETCH_NUM_ELEMENTS = 1 << 32
 _QUANTILES_SKETCH_NUM_STREAMS = 1
 _NUM_REPORTED_SEQUENCES_PER_TYPE = 5
+# Matches the default num_histogram_buckets of StatsOptions.
+_DEFAULT_NUM_HISTOGRAM_BUCKETS = 10
 
 
 _ReportedSequence = tfx_namedtuple.namedtuple(
     '_ReportedSequence', ['sequence', 'hash_value', 'metric'])
 
+# Arrow value sets of the coverage and sequence length constraints of a
+# feature, used for vectorized membership tests.
+_TokenValueSets = tfx_namedtuple.namedtuple('_TokenValueSets', [
+    'excluded_string_tokens', 'excluded_int_tokens', 'oov_string_tokens',
+    'sequence_length_excluded_int_tokens',
+    'sequence_length_excluded_string_tokens'
+])
 
-def _sort_and_truncate_reported_sequence(sequence: List[_ReportedSequence]):
-  sequence.sort(key=lambda x: x.metric)
-  deduped_values = []
-  hash_values = set()
-  for s in sequence:
-    if s.hash_value in hash_values:
-      continue
-    hash_values.add(s.hash_value)
-    deduped_values.append(s)
-  return deduped_values[:_NUM_REPORTED_SEQUENCES_PER_TYPE]
+# Array representation of a vocabulary. `tokens` holds the string tokens and
+# `ids` the corresponding integer tokens.
+_VocabLookup = tfx_namedtuple.namedtuple('_VocabLookup', ['tokens', 'ids'])
+
+# Array representation of a reverse vocabulary. `ids` holds the sorted integer
+# tokens and `tokens` the corresponding string tokens.
+_ReverseVocabLookup = tfx_namedtuple.namedtuple('_ReverseVocabLookup',
+                                                ['ids', 'tokens'])
+
+
+def _insert_reported_sequence(sequences: List[_ReportedSequence],
+                              sequence: _ReportedSequence) -> None:
+  """Inserts a sequence into a bounded list of reported sequences.
+
+  The list is kept sorted by metric and holds at most
+  _NUM_REPORTED_SEQUENCES_PER_TYPE distinct sequences with the smallest
+  metrics. Sequences with equal metrics keep their insertion order.
+
+  Args:
+    sequences: The sorted list of reported sequences to update in place.
+    sequence: The candidate sequence.
+  """
+  if (len(sequences) >= _NUM_REPORTED_SEQUENCES_PER_TYPE and
+      sequence.metric >= sequences[-1].metric):
+    return
+  if any(s.hash_value == sequence.hash_value for s in sequences):
+    return
+  index = len(sequences)
+  while index and sequences[index - 1].metric > sequence.metric:
+    index -= 1
+  sequences.insert(index, sequence)
+  del sequences[_NUM_REPORTED_SEQUENCES_PER_TYPE:]
+
+
+def _can_insert_reported_sequence(sequences: List[_ReportedSequence],
+                                  metric: float) -> bool:
+  """Returns whether a sequence with metric could be reported."""
+  return (len(sequences) < _NUM_REPORTED_SEQUENCES_PER_TYPE or
+          metric < sequences[-1].metric)
 
 
 class _TokenStats(object):
   """Tracks statistics for individual tokens."""
+  __slots__ = [
+      'frequency', 'num_sequences', 'per_sequence_min_frequency',
+      'per_sequence_max_frequency', 'positions']
 
-  def __init__(self):
+  def __init__(self, num_histogram_buckets: int):
     self.frequency = 0
     self.num_sequences = 0
     self.per_sequence_min_frequency = None
     self.per_sequence_max_frequency = None
-    self.positions = collections.Counter()
+    # Number of occurrences of the token per position histogram bucket.
+    self.positions = np.zeros(num_histogram_buckets, dtype=np.int64)
 
   def __iadd__(self, other: '_TokenStats') -> '_TokenStats':
     """Merge two _TokenStats."""
@@ -98,6 +143,29 @@ class _TokenStats(object):
     self.positions += other.positions
     return self
 
+  def update(self, positions: Union[List[int], np.ndarray]) -> None:
+    """Update the token statistics with the occurrences in a single sequence.
+
+    Args:
+      positions: The position histogram bucket of each occurrence of the token
+        within the sequence.
+    """
+    num_occur = len(positions)
+    self.frequency += num_occur
+    self.num_sequences += (1 if num_occur else 0)
+    if self.per_sequence_min_frequency is not None:
+      self.per_sequence_min_frequency = min(self.per_sequence_min_frequency,
+                                            num_occur)
+    else:
+      self.per_sequence_min_frequency = num_occur
+    if self.per_sequence_max_frequency is not None:
+      self.per_sequence_max_frequency = max(self.per_sequence_max_frequency,
+                                            num_occur)
+    else:
+      self.per_sequence_max_frequency = num_occur
+    if num_occur:
+      np.add.at(self.positions, positions, 1)
+
 
 # TODO(b/175875824): Determine if we should remove NL features from the default
 # Top-K computation which is largely redundant.
@@ -109,7 +177,9 @@ class _PartialNLStats(object):
                num_in_vocab_tokens: int = 0,
                total_num_tokens: int = 0,
                sum_in_vocab_token_lengths: int = 0,
-               num_examples: int = 0) -> None:
+               num_examples: int = 0,
+               num_histogram_buckets: int = _DEFAULT_NUM_HISTOGRAM_BUCKETS
+              ) -> None:
     # True only if this feature should never be considered, e.g: some
     # value_lists have inconsistent types or feature doesn't have an
     # NL domain.
@@ -128,7 +198,8 @@ class _PartialNLStats(object):
         _QUANTILES_SKETCH_NUM_STREAMS)
     self.token_occurrence_counts = sketches.MisraGriesSketch(
         _NUM_MISRAGRIES_SKETCH_BUCKETS)
-    self.token_statistics = collections.defaultdict(_TokenStats)
+    self.token_statistics = collections.defaultdict(
+        functools.partial(_TokenStats, num_histogram_buckets))
     self.reported_sequences_coverage = []
     self.reported_sequences_avg_token_length = []
 
@@ -155,209 +226,466 @@ class _PartialNLStats(object):
     self.sequence_length_quantiles.Merge(other.sequence_length_quantiles)
     self.token_occurrence_counts.Merge(other.token_occurrence_counts)
 
-    for t in other.token_statistics:
-      if t not in self.token_statistics:
-        self.token_statistics[t] = other.token_statistics[t]
+    # Use get() rather than indexing so that the defaultdict does not create
+    # an empty _TokenStats for tokens that are only in other.
+    for t, other_stats in other.token_statistics.items():
+      self_stats = self.token_statistics.get(t)
+      if self_stats is None:
+        self.token_statistics[t] = other_stats
       else:
-        self.token_statistics[t] += other.token_statistics[t]
-
-    for list_name in [
-        'reported_sequences_coverage', 'reported_sequences_avg_token_length'
-    ]:
-      cur_list = getattr(self, list_name)
-      cur_list += getattr(other, list_name)
-      cur_list = _sort_and_truncate_reported_sequence(cur_list)
-      setattr(self, list_name, cur_list)
+        self_stats += other_stats
+
+    for s in other.reported_sequences_coverage:
+      _insert_reported_sequence(self.reported_sequences_coverage, s)
+    for s in other.reported_sequences_avg_token_length:
+      _insert_reported_sequence(self.reported_sequences_avg_token_length, s)
     return self
 
 
 def _update_accumulator_with_in_vocab_string_tokens(
-    accumulator: _PartialNLStats, token_list: List[Text]):
-  accumulator.num_in_vocab_tokens += len(token_list)
-  accumulator.token_occurrence_counts.AddValues(pa.array(token_list))
+    accumulator: _PartialNLStats, tokens: pa.Array):
+  """Update the accumulator with a batch of in-vocab string tokens."""
+  if not tokens:
+    return
+  accumulator.num_in_vocab_tokens += len(tokens)
+  accumulator.token_occurrence_counts.AddValues(tokens)
+
+  token_lens = pc.cast(pc.utf8_length(tokens), pa.int64())
+  accumulator.sum_in_vocab_token_lengths += pc.sum(token_lens).as_py()
+  accumulator.vocab_token_length_quantiles.AddValues(token_lens)
+
+
+def _make_value_set(tokens: Iterable[Union[int, Text]],
+                    value_type: pa.DataType) -> pa.Array:
+  return pa.array(sorted(tokens), type=value_type)
+
+
+def _is_in(values: pa.Array, value_set: pa.Array) -> np.ndarray:
+  """Returns a boolean mask of the values that are members of value_set."""
+  if not value_set:
+    return np.zeros(len(values), dtype=bool)
+  return pc.is_in(values, value_set=value_set).to_numpy(zero_copy_only=False)
+
+
+def _make_vocab_lookup(vocab: Dict[Text, int]) -> _VocabLookup:
+  return _VocabLookup(
+      tokens=pa.array(list(vocab.keys()), type=pa.string()),
+      ids=pa.array(list(vocab.values()), type=pa.int64()))
+
+
+def _lookup_int_tokens(values: pa.Array,
+                       vocab_lookup: _VocabLookup) -> pa.Array:
+  """Maps string tokens to integer tokens, or null if not in the vocab."""
+  return vocab_lookup.ids.take(
+      pc.index_in(values, value_set=vocab_lookup.tokens))
+
+
+def _make_reverse_vocab_lookup(
+    rvocab: Dict[int, Text]) -> _ReverseVocabLookup:
+  ids = sorted(rvocab)
+  return _ReverseVocabLookup(
+      ids=np.array(ids, dtype=np.int64),
+      tokens=pa.array([rvocab[i] for i in ids], type=pa.string()))
 
-  token_len_list = [len(t) for t in token_list]
-  accumulator.sum_in_vocab_token_lengths += sum(token_len_list)
-  accumulator.vocab_token_length_quantiles.AddValues(pa.array(token_len_list))
+
+def _lookup_string_tokens(values: pa.Array,
+                          rvocab_lookup: _ReverseVocabLookup) -> pa.Array:
+  """Maps integer tokens to string tokens, or null if not in the vocab."""
+  if not rvocab_lookup.ids.size:
+    return pa.nulls(len(values), type=pa.string())
+  values = np.asarray(values, dtype=np.int64)
+  indices = np.minimum(
+      np.searchsorted(rvocab_lookup.ids, values), rvocab_lookup.ids.size - 1)
+  found = rvocab_lookup.ids[indices] == values
+  return rvocab_lookup.tokens.take(
+      pa.array(indices, mask=~found, type=pa.int64()))
+
+
+def _update_min_sequence_length(previous_min_sequence_length: Optional[int],
+                                sequence_lengths: np.ndarray) -> int:
+  """Returns the minimum sequence length after a batch of sequence lengths.
+
+  Matches updating the minimum one length at a time with
+  `length if not minimum else min(minimum, length)`, so a minimum of 0 is
+  replaced by the next length. Lengths can be negative when a token is
+  excluded both as an int and as a string token, and a negative minimum is
+  never replaced.
+
+  Args:
+    previous_min_sequence_length: The minimum before the batch, if any.
+    sequence_lengths: The non-empty sequence lengths of the batch, in order.
+  """
+  if (previous_min_sequence_length is not None and
+      previous_min_sequence_length < 0):
+    return min(previous_min_sequence_length, int(np.min(sequence_lengths)))
+  # The first negative length replaces any non-negative minimum.
+  negative_length_indices = np.flatnonzero(sequence_lengths < 0)
+  if negative_length_indices.size:
+    return int(np.min(sequence_lengths[negative_length_indices[0]:]))
+  # Otherwise only the lengths after the last zero length count.
+  zero_length_indices = np.flatnonzero(sequence_lengths == 0)
+  if zero_length_indices.size:
+    sequence_lengths_after_zero = sequence_lengths[zero_length_indices[-1] + 1:]
+    return (int(np.min(sequence_lengths_after_zero))
+            if sequence_lengths_after_zero.size else 0)
+  min_sequence_length = int(np.min(sequence_lengths))
+  if previous_min_sequence_length:
+    min_sequence_length = min(previous_min_sequence_length, min_sequence_length)
+  return min_sequence_length
+
+
+def _update_accumulator_with_sequence_lengths(
+    accumulator: _PartialNLStats, parent_indices: np.ndarray, num_rows: int,
+    num_excluded_tokens: np.ndarray):
+  """Update sequence length statistics for a batch of rows.
+
+  Args:
+    accumulator: The accumulator to update.
+    parent_indices: The row index of each token of the flattened batch.
+    num_rows: The number of rows in the batch.
+    num_excluded_tokens: The number of times each token of the flattened batch
+      is excluded when calculating the sequence length (a token can be
+      excluded both as an int and as a string token).
+  """
+  row_lengths = np.bincount(parent_indices, minlength=num_rows)
+  sequence_lengths = row_lengths - np.bincount(
+      parent_indices, weights=num_excluded_tokens,
+      minlength=num_rows).astype(np.int64)
+  # Empty and null rows do not have a sequence length.
+  sequence_lengths = sequence_lengths[row_lengths > 0]
+  if not sequence_lengths.size:
+    return
+  accumulator.sequence_length_quantiles.AddValues(
+      pa.array(sequence_lengths, type=pa.int64()))
+  accumulator.min_sequence_length = _update_min_sequence_length(
+      accumulator.min_sequence_length, sequence_lengths)
+  # The maximum follows the same rule on negated lengths.
+  previous_max_sequence_length = accumulator.max_sequence_length
+  accumulator.max_sequence_length = -_update_min_sequence_length(
+      None if previous_max_sequence_length is None else
+      -previous_max_sequence_length, -sequence_lengths)
+
+
+def _compute_reported_sequence_metrics(
+    parent_indices: np.ndarray, num_rows: int, is_covered: np.ndarray,
+    token_lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+  """Computes the reported sequence metrics of every row of a batch.
+
+  Args:
+    parent_indices: The row index of each token of the flattened batch.
+    num_rows: The number of rows in the batch.
+    is_covered: Whether each token of the flattened batch is a string token
+      that is not an OOV token.
+    token_lengths: The length of each token of the flattened batch.
+
+  Returns:
+    A tuple of the coverage and the average covered token length of each row.
+    Both are 0 for empty and null rows.
+  """
+  row_lengths = np.bincount(parent_indices, minlength=num_rows)
+  num_covered = np.bincount(
+      parent_indices, weights=is_covered, minlength=num_rows)
+  covered_lengths = np.bincount(
+      parent_indices, weights=np.where(is_covered, token_lengths, 0),
+      minlength=num_rows)
+  coverage = np.divide(
+      num_covered, row_lengths, out=np.zeros(num_rows),
+      where=row_lengths > 0)
+  avg_token_length = np.divide(
+      covered_lengths, num_covered, out=np.zeros(num_rows),
+      where=num_covered > 0)
+  return coverage, avg_token_length
+
+
+def _compute_int_batch_statistics(
+    values: pa.Array, parent_indices: np.ndarray, num_rows: int,
+    accumulator: _PartialNLStats, value_sets: _TokenValueSets,
+    unused_vocab_lookup: Optional[_VocabLookup],
+    rvocab_lookup: Optional[_ReverseVocabLookup]
+) -> Tuple[np.ndarray, np.ndarray]:
+  """Compute batch level statistics for a flattened batch of integer tokens.
+
+  Returns the reported sequence metrics of each row, see
+  _compute_reported_sequence_metrics.
+  """
+  keep = ~_is_in(values, value_sets.excluded_int_tokens)
+  num_excluded_tokens = _is_in(
+      values, value_sets.sequence_length_excluded_int_tokens).astype(np.int64)
+  # Integer tokens that cannot be resolved to a string token never count
+  # towards the coverage of a reported sequence.
+  is_covered = np.zeros(len(values), dtype=bool)
+  token_lengths = np.zeros(len(values), dtype=np.int64)
+  if rvocab_lookup is not None:
+    str_values = _lookup_string_tokens(values, rvocab_lookup)
+    keep &= ~_is_in(str_values, value_sets.excluded_string_tokens)
+    is_covered = (
+        str_values.is_valid().to_numpy(zero_copy_only=False) &
+        ~_is_in(str_values, value_sets.oov_string_tokens))
+    _update_accumulator_with_in_vocab_string_tokens(
+        accumulator,
+        str_values.filter(pa.array(keep & is_covered, type=pa.bool_())))
+    num_excluded_tokens += _is_in(
+        str_values, value_sets.sequence_length_excluded_string_tokens)
+    token_lengths = pc.utf8_length(str_values).fill_null(0).to_numpy(
+        zero_copy_only=False)
+  accumulator.total_num_tokens += int(np.count_nonzero(keep))
+  _update_accumulator_with_sequence_lengths(accumulator, parent_indices,
+                                            num_rows, num_excluded_tokens)
+  return _compute_reported_sequence_metrics(parent_indices, num_rows,
+                                            is_covered, token_lengths)
+
+
+def _compute_str_batch_statistics(
+    values: pa.Array, parent_indices: np.ndarray, num_rows: int,
+    accumulator: _PartialNLStats, value_sets: _TokenValueSets,
+    vocab_lookup: Optional[_VocabLookup],
+    unused_rvocab_lookup: Optional[_ReverseVocabLookup]
+) -> Tuple[np.ndarray, np.ndarray]:
+  """Compute batch level statistics for a flattened batch of string tokens.
+
+  Returns the reported sequence metrics of each row, see
+  _compute_reported_sequence_metrics.
+  """
+  keep = ~_is_in(values, value_sets.excluded_string_tokens)
+  num_excluded_tokens = _is_in(
+      values,
+      value_sets.sequence_length_excluded_string_tokens).astype(np.int64)
+  if vocab_lookup is not None:
+    int_values = _lookup_int_tokens(values, vocab_lookup)
+    keep &= ~_is_in(int_values, value_sets.excluded_int_tokens)
+    num_excluded_tokens += _is_in(
+        int_values, value_sets.sequence_length_excluded_int_tokens)
+  accumulator.total_num_tokens += int(np.count_nonzero(keep))
+  is_covered = ~_is_in(values, value_sets.oov_string_tokens)
+  _update_accumulator_with_in_vocab_string_tokens(
+      accumulator, values.filter(pa.array(keep & is_covered, type=pa.bool_())))
+  _update_accumulator_with_sequence_lengths(accumulator, parent_indices,
+                                            num_rows, num_excluded_tokens)
+  return _compute_reported_sequence_metrics(
+      parent_indices, num_rows, is_covered,
+      pc.utf8_length(values).to_numpy(zero_copy_only=False))
+
+
+def _get_position_buckets(row_len: int,
+                          num_histogram_buckets: int) -> np.ndarray:
+  """Returns the position histogram bucket of each index of a row.
+
+  The bucket is computed as i / row_len * num_histogram_buckets rather than
+  with a precomputed num_histogram_buckets / row_len multiplier, since the
+  latter rounds differently and can shift positions across bucket bounds.
+
+  Args:
+    row_len: The number of tokens in the row.
+    num_histogram_buckets: The number of buckets of the position histograms.
+  """
+  return (np.arange(row_len) / row_len * num_histogram_buckets).astype(
+      np.int64)
 
 
 def _update_accumulator_with_token_statistics(accumulator: _PartialNLStats,
                                               row: List[Union[int, Text]],
                                               tokens: Union[Set[int],
                                                             Set[Text]],
-                                              num_histogram_buckets):
+                                              position_buckets: np.ndarray):
   """Compute token statistics for a specific row."""
+  if not tokens:
+    return
+  # Collect the indices of all the tokens in a single pass over the row.
+  indices = collections.defaultdict(list)
+  for i, v in enumerate(row):
+    if v in tokens:
+      indices[v].append(i)
+  token_statistics = accumulator.token_statistics
   for t in tokens:
-    norm_indices = [float(i) / len(row) for i, v in enumerate(row) if v == t]
-    num_occur = len(norm_indices)
-    accumulator.token_statistics[t].frequency += num_occur
-    accumulator.token_statistics[t].num_sequences += (1 if num_occur else 0)
-    for attr, fn in [('per_sequence_min_frequency', min),
-                     ('per_sequence_max_frequency', max)]:
-      accum_freq = getattr(accumulator.token_statistics[t], attr)
-      if accum_freq is not None:
-        setattr(accumulator.token_statistics[t], attr,
-                fn(accum_freq, num_occur))
-      else:
-        setattr(accumulator.token_statistics[t], attr, num_occur)
-    for i in norm_indices:
-      accumulator.token_statistics[t].positions[int(i *
-                                                    num_histogram_buckets)] += 1
+    token_statistics[t].update(position_buckets[indices.get(t, [])])
 
 
-def _update_accumulator_reported_sequences(accumulator: _PartialNLStats,
-                                           resolved_entry: List[Union[Text,
-                                                                      int]],
-                                           oov_string_tokens: Set[Text]):
-  """Update reported sequences in accumulator."""
-  token_lens = [
-      len(i) for i in resolved_entry
-      if (isinstance(i, str) and i not in oov_string_tokens)
-  ]
+def _update_accumulator_with_int_token_statistics(
+    accumulator: _PartialNLStats, row: np.ndarray, tokens: Set[int],
+    position_buckets: np.ndarray):
+  """Compute token statistics for a row that only contains integer tokens.
 
-  coverage = (float(len(token_lens)) / len(resolved_entry))
-  if token_lens:
-    avg_token_len = float(sum(token_lens)) / len(token_lens)
-  else:
-    avg_token_len = 0
+  The occurrences of all the tokens are found with a single vectorized scan of
+  the row rather than a Python-level scan per token.
 
-  for attr, metric in [('reported_sequences_coverage', coverage),
-                       ('reported_sequences_avg_token_length', avg_token_len)]:
-    cur_list = getattr(accumulator, attr)
-    cur_list.append(
-        _ReportedSequence(
-            sequence=resolved_entry,
-            hash_value=hash(str(resolved_entry)),
-            metric=metric))
-    cur_list = _sort_and_truncate_reported_sequence(cur_list)
-    setattr(accumulator, attr, cur_list)
+  Args:
+    accumulator: The accumulator to update.
+    row: The row of integer tokens.
+    tokens: The integer tokens to compute statistics for.
+    position_buckets: The position histogram bucket of each index of the row.
+  """
+  if not tokens:
+    return
+  row_ids = np.asarray(row, dtype=np.int64)
+  token_ids = np.fromiter(tokens, dtype=np.int64, count=len(tokens))
+  match_indices = np.flatnonzero(np.isin(row_ids, token_ids))
+  match_ids = row_ids[match_indices]
+  match_buckets = position_buckets[match_indices]
+  for t in tokens:
+    accumulator.token_statistics[t].update(
+        match_buckets[match_ids == t])
 
 
-def _update_accumulator_with_sequence_lengths(
-    accumulator: _PartialNLStats, sequence_length_excluded_int_tokens: Set[int],
-    sequence_length_excluded_string_tokens: Set[Text], max_sequence_length: int,
-    int_row: Optional[List[Union[int, Text]]],
-    string_row: Optional[List[Union[Text, int]]]):
-  """Update sequence length quantiles in accumulator.
+def _need_reported_sequences(accumulator: _PartialNLStats, coverage: float,
+                             avg_token_len: float) -> bool:
+  """Returns whether a row with the given metrics could be reported."""
+  return (_can_insert_reported_sequence(
+      accumulator.reported_sequences_coverage, coverage) or
+          _can_insert_reported_sequence(
+              accumulator.reported_sequences_avg_token_length, avg_token_len))
 
-  We expect that int_row and string row preserve the position of the the token
-  within the seqence and hence allow the lists to contain both ints and strings.
 
-  Args:
-    accumulator: The accumulator to update.
-    sequence_length_excluded_int_tokens: The int tokens to not consider when
-      calculating the length.
-    sequence_length_excluded_string_tokens: The string tokens to not consider
-      when calculating the length.
-    max_sequence_length: The max sequence length to use if no excluded tokens
-      are present.
-    int_row: The row of integer tokens. Note: the row can include strings if
-      there is an incomplete mapping from strings to ints (this preserves the
-      position).
-    string_row: The row of string tokens. Note: the row can include ints if if
-      there is an incomplete mapping from ints to strings (this preserves the
-      position).
-  """
-  sequence_length = max_sequence_length
-  if int_row is not None:
-    matches = [e for e in int_row if e in sequence_length_excluded_int_tokens]
-    sequence_length -= len(matches)
-  if string_row is not None:
-    matches = [
-        e for e in string_row if e in sequence_length_excluded_string_tokens
-    ]
-    sequence_length -= len(matches)
-  accumulator.sequence_length_quantiles.AddValues(pa.array([sequence_length]))
-  accumulator.min_sequence_length = (
-      sequence_length if not accumulator.min_sequence_length else min(
-          accumulator.min_sequence_length, sequence_length))
-  accumulator.max_sequence_length = (
-      sequence_length if not accumulator.max_sequence_length else max(
-          accumulator.max_sequence_length, sequence_length))
+def _update_accumulator_reported_sequences(accumulator: _PartialNLStats,
+                                           resolved_entry: List[Union[Text,
+                                                                      int]],
+                                           coverage: float,
+                                           avg_token_len: float):
+  """Update reported sequences in accumulator."""
+  hash_value = hash(str(resolved_entry))
+  _insert_reported_sequence(
+      accumulator.reported_sequences_coverage,
+      _ReportedSequence(
+          sequence=resolved_entry, hash_value=hash_value, metric=coverage))
+  _insert_reported_sequence(
+      accumulator.reported_sequences_avg_token_length,
+      _ReportedSequence(
+          sequence=resolved_entry, hash_value=hash_value,
+          metric=avg_token_len))
 
 
 def _compute_int_statistics(
-    row: List[int], accumulator: _PartialNLStats,
-    excluded_string_tokens: Set[Text], excluded_int_tokens: Set[int],
-    oov_string_tokens: Set[Text], unused_vocab: Optional[Dict[Text, int]],
+    row: np.ndarray, accumulator: _PartialNLStats,
+    unused_vocab: Optional[Dict[Text, int]],
     rvocab: Optional[Dict[int, Text]], int_tokens: Set[int],
-    string_tokens: Set[Text], sequence_length_excluded_int_tokens: Set[int],
-    sequence_length_excluded_string_tokens: Set[Text],
-    num_histogram_buckets: int):
+    string_tokens: Set[Text], num_histogram_buckets: int, coverage: float,
+    avg_token_len: float):
   """Compute statistics for an integer entry."""
-  accumulator.num_examples += 1
-  if row:
-    _update_accumulator_with_token_statistics(accumulator, row, int_tokens,
-                                              num_histogram_buckets)
+  if row.size:
+    # The position buckets only depend on the row length, so they are shared
+    # by the integer and the string token statistics of the row.
+    position_buckets = None
+    if int_tokens or (rvocab and string_tokens):
+      position_buckets = _get_position_buckets(len(row), num_histogram_buckets)
+    _update_accumulator_with_int_token_statistics(accumulator, row, int_tokens,
+                                                  position_buckets)
+    need_reported_sequences = _need_reported_sequences(accumulator, coverage,
+                                                       avg_token_len)
     string_row = None
-    if rvocab:
-      string_row = [rvocab.get(r, r) for r in row]
+    if rvocab and (string_tokens or need_reported_sequences):
+      string_row = [rvocab.get(r, r) for r in row.tolist()]
       _update_accumulator_with_token_statistics(accumulator, string_row,
                                                 string_tokens,
-                                                num_histogram_buckets)
-
-    _update_accumulator_reported_sequences(accumulator,
-                                           string_row if string_row else row,
-                                           oov_string_tokens)
-    _update_accumulator_with_sequence_lengths(
-        accumulator, sequence_length_excluded_int_tokens,
-        sequence_length_excluded_string_tokens, len(row), row, string_row)
-
-  filtered_entry_str_list = []
-  for entry in row:
-    if entry in excluded_int_tokens:
-      continue
-    # Vocabulary exists.
-    if rvocab is not None:
-      if entry in rvocab:
-        entry_str = rvocab[entry]
-        if entry_str in excluded_string_tokens:
-          continue
-        if entry_str not in oov_string_tokens:
-          filtered_entry_str_list.append(entry_str)
-    accumulator.total_num_tokens += 1
-  if filtered_entry_str_list:
-    _update_accumulator_with_in_vocab_string_tokens(accumulator,
-                                                    filtered_entry_str_list)
+                                                position_buckets)
+
+    if need_reported_sequences:
+      _update_accumulator_reported_sequences(
+          accumulator, string_row if string_row else row.tolist(), coverage,
+          avg_token_len)
 
 
 def _compute_str_statistics(
     row: List[Text], accumulator: _PartialNLStats,
-    excluded_string_tokens: Set[Text], excluded_int_tokens: Set[int],
-    oov_string_tokens: Set[Text], vocab: Optional[Dict[Text, int]],
+    vocab: Optional[Dict[Text, int]],
     unused_rvocab: Optional[Dict[int, Text]], int_tokens: Set[int],
-    string_tokens: Set[Text], sequence_length_excluded_int_tokens: Set[int],
-    sequence_length_excluded_string_tokens: Set[Text], num_histogram_buckets):
+    string_tokens: Set[Text], num_histogram_buckets, coverage: float,
+    avg_token_len: float):
   """Compute statistics for string features."""
-  accumulator.num_examples += 1
-  row = [six.ensure_text(e) for e in row]
   if row:
+    # The position buckets only depend on the row length, so they are shared
+    # by the string and the integer token statistics of the row.
+    position_buckets = None
+    if string_tokens or (vocab and int_tokens):
+      position_buckets = _get_position_buckets(len(row), num_histogram_buckets)
     _update_accumulator_with_token_statistics(accumulator, row, string_tokens,
-                                              num_histogram_buckets)
-    _update_accumulator_reported_sequences(accumulator, row, oov_string_tokens)
+                                              position_buckets)
+    if _need_reported_sequences(accumulator, coverage, avg_token_len):
+      _update_accumulator_reported_sequences(accumulator, row, coverage,
+                                             avg_token_len)
     int_row = None
-    if vocab:
+    if vocab and int_tokens:
       int_row = [vocab.get(r, r) for r in row]
       _update_accumulator_with_token_statistics(accumulator, int_row,
-                                                int_tokens,
-                                                num_histogram_buckets)
-    _update_accumulator_with_sequence_lengths(
-        accumulator, sequence_length_excluded_int_tokens,
-        sequence_length_excluded_string_tokens, len(row), int_row, row)
-
-  filtered_entry_list = []
-  for entry in row:
-    if entry in excluded_string_tokens:
-      continue
-    if (vocab is not None and entry in vocab and
-        vocab[entry] in excluded_int_tokens):
-      continue
-    if entry not in oov_string_tokens:
-      filtered_entry_list.append(entry)
-    accumulator.total_num_tokens += 1
-  if filtered_entry_list:
-    _update_accumulator_with_in_vocab_string_tokens(accumulator,
-                                                    filtered_entry_list)
+                                                int_tokens, position_buckets)
+
+
+def _compute_int_reported_sequences(row: np.ndarray,
+                                    accumulator: _PartialNLStats,
+                                    rvocab: Optional[Dict[int, Text]],
+                                    coverage: float, avg_token_len: float):
+  """Update the reported sequences with an integer entry.
+
+  Equivalent to _compute_int_statistics when no token constraints are
+  specified.
+  """
+  if row.size and _need_reported_sequences(accumulator, coverage,
+                                           avg_token_len):
+    row = row.tolist()
+    if rvocab:
+      row = [rvocab.get(r, r) for r in row]
+    _update_accumulator_reported_sequences(accumulator, row, coverage,
+                                           avg_token_len)
+
+
+def _compute_str_reported_sequences(row: List[Text],
+                                    accumulator: _PartialNLStats,
+                                    unused_rvocab: Optional[Dict[int, Text]],
+                                    coverage: float, avg_token_len: float):
+  """Update the reported sequences with a string entry.
+
+  Equivalent to _compute_str_statistics when no token constraints are
+  specified.
+  """
+  if row and _need_reported_sequences(accumulator, coverage, avg_token_len):
+    _update_accumulator_reported_sequences(accumulator, row, coverage,
+                                           avg_token_len)
+
+
+def _split_rows(feature_array: pa.Array, values: np.ndarray,
+                parent_indices: np.ndarray) -> List[Optional[np.ndarray]]:
+  """Splits the flattened values of a batch into one view per row.
+
+  Args:
+    feature_array: The (list) array of the batch.
+    values: The flattened values of feature_array.
+    parent_indices: The row index of each value in values.
+
+  Returns:
+    A list with a view of the values of each row, or None for null rows.
+  """
+  row_ends = np.cumsum(
+      np.bincount(parent_indices, minlength=len(feature_array))).tolist()
+  is_null = feature_array.is_null().to_numpy(zero_copy_only=False).tolist()
+  rows = []
+  row_start = 0
+  for row_end, row_is_null in zip(row_ends, is_null):
+    rows.append(None if row_is_null else values[row_start:row_end])
+    row_start = row_end
+  return rows
+
+
+def _get_string_rows(feature_array: pa.Array, values: pa.Array,
+                     parent_indices: np.ndarray) -> List[Optional[List[Text]]]:
+  """Converts a batch of string tokens to Python lists, one per row.
+
+  Equal tokens within the batch share a single Python string object, so each
+  distinct token is decoded and hashed once per batch rather than once per
+  occurrence when it is looked up in the token sets and vocabularies.
+
+  Args:
+    feature_array: The (list) array of the batch.
+    values: The flattened string tokens of feature_array.
+    parent_indices: The row index of each token in values.
+
+  Returns:
+    A list with the tokens of each row, or None for null rows.
+  """
+  encoded = pc.dictionary_encode(values)
+  tokens = np.array(encoded.dictionary.to_pylist(), dtype=object)[
+      encoded.indices.to_numpy(zero_copy_only=False)]
+  return [
+      None if row is None else row.tolist()
+      for row in _split_rows(feature_array, tokens, parent_indices)
+  ]
 
 
 def _populate_token_length_histogram(
@@ -406,13 +734,14 @@ def _populate_token_position_histogram(
     token_proto: statistics_pb2.NaturalLanguageStatistics.TokenStatistics,
     stats: _TokenStats, num_histogram_buckets: int):
   """Populate the token position histogram."""
-  positions = list(stats.positions.items())
-  positions.sort(key=lambda x: x[0])
-  for k, v in positions:
-    low_value = float(k) / num_histogram_buckets
-    high_value = float(k + 1) / num_histogram_buckets
+  # flatnonzero returns the populated buckets in ascending order.
+  buckets = np.flatnonzero(stats.positions)
+  counts = stats.positions[buckets]
+  for k, count in zip(buckets.tolist(), counts.tolist()):
     token_proto.positions.buckets.add(
-        low_value=low_value, high_value=high_value, sample_count=v)
+        low_value=float(k) / num_histogram_buckets,
+        high_value=float(k + 1) / num_histogram_buckets,
+        sample_count=count)
 
 
 def _populate_token_statistics(
@@ -472,16 +801,30 @@ class NLStatsGenerator(stats_generator.CombinerFeatureStatsGenerator):
     self._nld_excluded_string_tokens = {}
     self._nld_excluded_int_tokens = {}
     self._nld_oov_string_tokens = {}
-    self._nld_specified_int_tokens = collections.defaultdict(set)
-    self._nld_specified_str_tokens = collections.defaultdict(set)
-    self._nld_sequence_length_excluded_int_tokens = {}
-    self._nld_sequence_length_excluded_string_tokens = {}
+    self._nld_token_value_sets = {}
+    self._nld_specified_int_tokens = collections.defaultdict(frozenset)
+    self._nld_specified_str_tokens = collections.defaultdict(frozenset)
     self._vocabs = {}
     self._rvocabs = {}
+    self._vocab_lookups = {}
+    self._rvocab_lookups = {}
     self._feature_type_fns = {
         statistics_pb2.FeatureNameStatistics.INT: _compute_int_statistics,
         statistics_pb2.FeatureNameStatistics.STRING: _compute_str_statistics
     }
+    # Used instead of _feature_type_fns for features without token
+    # constraints, for which only the reported sequences depend on the rows.
+    self._feature_type_reported_sequences_fns = {
+        statistics_pb2.FeatureNameStatistics.INT:
+            _compute_int_reported_sequences,
+        statistics_pb2.FeatureNameStatistics.STRING:
+            _compute_str_reported_sequences
+    }
+    self._feature_type_batch_fns = {
+        statistics_pb2.FeatureNameStatistics.INT: _compute_int_batch_statistics,
+        statistics_pb2.FeatureNameStatistics.STRING:
+            _compute_str_batch_statistics
+    }
     self._valid_feature_paths = set()
 
   def setup(self) -> None:
@@ -492,31 +835,45 @@ class NLStatsGenerator(stats_generator.CombinerFeatureStatsGenerator):
           nld = v.natural_language_domain
           self._nld_vocabularies[k] = nld.vocabulary
           coverage_constraints = nld.coverage
-          self._nld_excluded_string_tokens[k] = set(
+          self._nld_excluded_string_tokens[k] = frozenset(
               coverage_constraints.excluded_string_tokens)
-          self._nld_excluded_int_tokens[k] = set(
+          self._nld_excluded_int_tokens[k] = frozenset(
               coverage_constraints.excluded_int_tokens)
-          self._nld_oov_string_tokens[k] = set(
+          self._nld_oov_string_tokens[k] = frozenset(
               coverage_constraints.oov_string_tokens)
           sequence_length_constraints = nld.sequence_length_constraints
-          self._nld_sequence_length_excluded_int_tokens[k] = set(
-              sequence_length_constraints.excluded_int_value)
-          self._nld_sequence_length_excluded_string_tokens[k] = set(
-              sequence_length_constraints.excluded_string_value)
+          self._nld_token_value_sets[k] = _TokenValueSets(
+              excluded_string_tokens=_make_value_set(
+                  self._nld_excluded_string_tokens[k], pa.string()),
+              excluded_int_tokens=_make_value_set(
+                  self._nld_excluded_int_tokens[k], pa.int64()),
+              oov_string_tokens=_make_value_set(
+                  self._nld_oov_string_tokens[k], pa.string()),
+              sequence_length_excluded_int_tokens=_make_value_set(
+                  set(sequence_length_constraints.excluded_int_value),
+                  pa.int64()),
+              sequence_length_excluded_string_tokens=_make_value_set(
+                  set(sequence_length_constraints.excluded_string_value),
+                  pa.string()))
           if (self._nld_vocabularies[k] or
               self._nld_excluded_string_tokens[k] or
               self._nld_excluded_int_tokens[k] or
               self._nld_oov_string_tokens[k]):
             self._valid_feature_paths.add(k)
-          for t in nld.token_constraints:
-            if t.WhichOneof('value') == _INT_VALUE:
-              self._nld_specified_int_tokens[k].add(t.int_value)
-            else:
-              self._nld_specified_str_tokens[k].add(t.string_value)
+          self._nld_specified_int_tokens[k] = frozenset(
+              t.int_value
+              for t in nld.token_constraints
+              if t.WhichOneof('value') == _INT_VALUE)
+          self._nld_specified_str_tokens[k] = frozenset(
+              t.string_value
+              for t in nld.token_constraints
+              if t.WhichOneof('value') != _INT_VALUE)
 
     if self._vocab_paths is not None:
       for k, v in self._vocab_paths.items():
         self._vocabs[k], self._rvocabs[k] = vocab_util.load_vocab(v)
+        self._vocab_lookups[k] = _make_vocab_lookup(self._vocabs[k])
+        self._rvocab_lookups[k] = _make_reverse_vocab_lookup(self._rvocabs[k])
 
   def create_accumulator(self) -> _PartialNLStats:
     """Return a fresh, empty accumulator.
@@ -524,7 +881,7 @@ class NLStatsGenerator(stats_generator.CombinerFeatureStatsGenerator):
     Returns:
       An empty accumulator.
     """
-    return _PartialNLStats()
+    return _PartialNLStats(num_histogram_buckets=self._num_histogram_buckets)
 
   def add_input(self, accumulator: _PartialNLStats,
                 feature_path: types.FeaturePath,
@@ -558,30 +915,54 @@ class NLStatsGenerator(stats_generator.CombinerFeatureStatsGenerator):
 
     vocab = None
     rvocab = None
+    vocab_lookup = None
+    rvocab_lookup = None
     if self._nld_vocabularies[feature_path]:
       vocab_name = self._nld_vocabularies[feature_path]
       vocab = self._vocabs[vocab_name]
       rvocab = self._rvocabs[vocab_name]
+      vocab_lookup = self._vocab_lookups[vocab_name]
+      rvocab_lookup = self._rvocab_lookups[vocab_name]
 
-    excluded_string_tokens = self._nld_excluded_string_tokens[feature_path]
-    excluded_int_tokens = self._nld_excluded_int_tokens[feature_path]
-    oov_string_tokens = self._nld_oov_string_tokens[feature_path]
     int_tokens = self._nld_specified_int_tokens[feature_path]
     string_tokens = self._nld_specified_str_tokens[feature_path]
-    sequence_length_excluded_int_tokens = (
-        self._nld_sequence_length_excluded_int_tokens[feature_path])
-    sequence_length_excluded_string_tokens = (
-        self._nld_sequence_length_excluded_string_tokens[feature_path])
-
-    # TODO(b/175875824): Benchmark and optimize performance.
-    for row in feature_array.to_pylist():
-      if row is not None:
-        feature_type_fn(row, accumulator, excluded_string_tokens,
-                        excluded_int_tokens, oov_string_tokens, vocab, rvocab,
-                        int_tokens, string_tokens,
-                        sequence_length_excluded_int_tokens,
-                        sequence_length_excluded_string_tokens,
-                        self._num_histogram_buckets)
+
+    # Coverage statistics only depend on individual tokens and sequence lengths
+    # and reported sequence metrics only on per-row sums over tokens, so they
+    # are computed over the flattened values of the whole batch at once.
+    values, parent_indices = array_util.flatten_nested(
+        feature_array, return_parent_indices=True)
+    if feature_type == statistics_pb2.FeatureNameStatistics.STRING:
+      # Decode the tokens once for the whole batch, so the rows passed to
+      # _compute_str_statistics already hold text.
+      values = values.cast(pa.string())
+    coverages, avg_token_lens = self._feature_type_batch_fns[feature_type](
+        values, parent_indices, len(feature_array), accumulator,
+        self._nld_token_value_sets[feature_path], vocab_lookup, rvocab_lookup)
+    accumulator.num_examples += len(feature_array) - feature_array.null_count
+
+    if feature_type == statistics_pb2.FeatureNameStatistics.STRING:
+      rows = _get_string_rows(feature_array, values, parent_indices)
+    else:
+      # Integer rows are passed as views of the flattened values, so tokens
+      # are only boxed into Python ints for rows that need them.
+      rows = _split_rows(feature_array,
+                         values.to_numpy(zero_copy_only=False),
+                         parent_indices)
+    row_metrics = zip(rows, coverages.tolist(), avg_token_lens.tolist())
+    if int_tokens or string_tokens:
+      for row, coverage, avg_token_len in row_metrics:
+        if row is not None:
+          feature_type_fn(row, accumulator, vocab, rvocab, int_tokens,
+                          string_tokens, self._num_histogram_buckets, coverage,
+                          avg_token_len)
+    else:
+      reported_sequences_fn = self._feature_type_reported_sequences_fns[
+          feature_type]
+      for row, coverage, avg_token_len in row_metrics:
+        if row is not None:
+          reported_sequences_fn(row, accumulator, rvocab, coverage,
+                                avg_token_len)
     return accumulator
 
   def merge_accumulators(
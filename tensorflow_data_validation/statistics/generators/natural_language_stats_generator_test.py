@@ -20,6 +20,7 @@ from __future__ import print_function
 import tempfile
 
 from absl.testing import absltest
+import numpy as np
 import pyarrow as pa
 
 from tensorflow_data_validation import types
@@ -123,13 +124,14 @@ class NaturalLanguageStatsGeneratorTest(
 
   def test_partial_stats_iadd(self):
     stats = nlsg._PartialNLStats(
-        invalidate=False, num_in_vocab_tokens=2, total_num_tokens=3)
+        invalidate=False, num_in_vocab_tokens=2, total_num_tokens=3,
+        num_histogram_buckets=3)
     stats.vocab_token_length_quantiles.AddValues(pa.array([1, 2, 2]))
     stats.token_occurrence_counts.AddValues(pa.array([b'foo', b'bar', b'bar']))
     stats.min_sequence_length = 3
     stats.max_sequence_length = 7
     stats.sequence_length_quantiles.AddValues(pa.array([1, 2, 2]))
-    ts = nlsg._TokenStats()
+    ts = nlsg._TokenStats(num_histogram_buckets=3)
     ts.frequency = 10
     ts.num_sequences = 2
     ts.per_sequence_min_frequency = 3
@@ -139,13 +141,14 @@ class NaturalLanguageStatsGeneratorTest(
     stats.token_statistics['foo'] = ts
 
     stats_2 = nlsg._PartialNLStats(
-        invalidate=False, num_in_vocab_tokens=7, total_num_tokens=10)
+        invalidate=False, num_in_vocab_tokens=7, total_num_tokens=10,
+        num_histogram_buckets=3)
     stats_2.vocab_token_length_quantiles.AddValues(pa.array([2, 3]))
     stats_2.token_occurrence_counts.AddValues(pa.array([b'bar', b'baz']))
     stats_2.min_sequence_length = None
     stats_2.max_sequence_length = 9
     stats_2.sequence_length_quantiles.AddValues(pa.array([2, 3]))
-    ts1 = nlsg._TokenStats()
+    ts1 = nlsg._TokenStats(num_histogram_buckets=3)
     ts1.frequency = 12
     ts1.num_sequences = 1
     ts1.per_sequence_min_frequency = 4
@@ -196,6 +199,80 @@ class NaturalLanguageStatsGeneratorTest(
     self.assertEqual(bar_ts_result.per_sequence_max_frequency, 8)
     self.assertEqual(bar_ts_result.positions[1], 12)
 
+  def test_partial_stats_default_num_histogram_buckets(self):
+    stats = nlsg._PartialNLStats()
+    stats.token_statistics['foo'].update([0, 9, 9])
+    foo_ts_result = stats.token_statistics['foo']
+    self.assertEqual(foo_ts_result.frequency, 3)
+    self.assertLen(foo_ts_result.positions,
+                   nlsg._DEFAULT_NUM_HISTOGRAM_BUCKETS)
+    self.assertEqual(foo_ts_result.positions[0], 1)
+    self.assertEqual(foo_ts_result.positions[9], 2)
+
+  def test_partial_stats_iadd_reported_sequences(self):
+    stats = nlsg._PartialNLStats()
+    for i, metric in enumerate([0.5, 0.1, 0.5, 0.9]):
+      nlsg._insert_reported_sequence(
+          stats.reported_sequences_coverage,
+          nlsg._ReportedSequence(
+              sequence=[i], hash_value=hash(str([i])), metric=metric))
+    stats_2 = nlsg._PartialNLStats()
+    for i, metric in enumerate([0.5, 0.1, 0.2, 0.05]):
+      nlsg._insert_reported_sequence(
+          stats_2.reported_sequences_coverage,
+          nlsg._ReportedSequence(
+              sequence=[i + 4], hash_value=hash(str([i + 4])),
+              metric=metric))
+
+    stats += stats_2
+    self.assertListEqual(
+        [s.sequence for s in stats.reported_sequences_coverage],
+        [[7], [1], [5], [6], [0]])
+
+  def test_sequence_lengths_with_fully_excluded_row(self):
+    stats = nlsg._PartialNLStats()
+    # The tokens of the first row are all excluded, so its sequence length is
+    # 0. The following rows have sequence lengths 3 and 2.
+    nlsg._update_accumulator_with_sequence_lengths(
+        stats, parent_indices=np.array([0, 0, 1, 1, 1, 2, 2]), num_rows=3,
+        num_excluded_tokens=np.array([1, 1, 0, 0, 0, 0, 0]))
+    self.assertEqual(2, stats.min_sequence_length)
+    self.assertEqual(3, stats.max_sequence_length)
+
+    # A batch ending with a zero length sequence resets the minimum to 0.
+    nlsg._update_accumulator_with_sequence_lengths(
+        stats, parent_indices=np.array([0, 1]), num_rows=2,
+        num_excluded_tokens=np.array([0, 1]))
+    self.assertEqual(0, stats.min_sequence_length)
+    self.assertEqual(3, stats.max_sequence_length)
+
+    # A token excluded both as an int and as a string token makes the sequence
+    # length negative. A negative minimum is not replaced by later lengths.
+    stats = nlsg._PartialNLStats()
+    nlsg._update_accumulator_with_sequence_lengths(
+        stats, parent_indices=np.array([0, 1, 1]), num_rows=2,
+        num_excluded_tokens=np.array([2, 0, 0]))
+    self.assertEqual(-1, stats.min_sequence_length)
+    self.assertEqual(2, stats.max_sequence_length)
+    nlsg._update_accumulator_with_sequence_lengths(
+        stats, parent_indices=np.array([0, 1]), num_rows=2,
+        num_excluded_tokens=np.array([1, 0]))
+    self.assertEqual(-1, stats.min_sequence_length)
+    self.assertEqual(2, stats.max_sequence_length)
+
+  def test_partial_stats_quantiles_many_values(self):
+    num_values = 10000
+    stats = nlsg._PartialNLStats()
+    stats.sequence_length_quantiles.AddValues(
+        pa.array(range(num_values), type=pa.int64()))
+    quantiles = stats.sequence_length_quantiles.GetQuantiles(4)
+    quantiles = quantiles.flatten().to_pylist()
+    self.assertLen(quantiles, 5)
+    for i, q in enumerate(quantiles):
+      self.assertAlmostEqual(
+          q, i * (num_values - 1) / 4,
+          delta=nlsg._QUANTILES_SKETCH_ERROR * num_values)
+
   def _create_expected_feature_name_statistics(
       self,
       feature_coverage=None,